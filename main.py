@@ -6,13 +6,23 @@ using multithreading for improved performance.
 """
 
 import requests
-import json
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import ProtocolError, ReadTimeoutError
+from urllib3.util import Retry
+import orjson
 import datetime
+import logging
 import os
-from threading import Thread
-from typing import List, Dict, Optional, Tuple
+import queue
+import shutil
+import sys
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+from functools import lru_cache
+from logging.handlers import QueueHandler, QueueListener
+from typing import List, Dict, Optional, Set, Tuple
 from tqdm import tqdm
-from urllib.parse import quote
+from urllib.parse import quote, urlencode
 
 # Configuration - should be moved to environment variables or config file
 ZABBIX_API_URL: str = ""
@@ -27,52 +37,95 @@ TIME_TILL: str = "2025-12-24 00:00:00"
 FORBIDDEN_SYMBOLS: List[str] = ['<', '>', ':', '"', '/', '\\', '|', '?', '*']
 RESULTING_IMAGE_WIDTH: int = 1920
 RESULTING_IMAGE_HEIGHT: int = 200
-DOWNLOAD_RETRY_COUNT: int = 500
+FORBIDDEN_SYMBOLS_TABLE: Dict[int, None] = str.maketrans('', '', ''.join(FORBIDDEN_SYMBOLS))
+HTTP_RETRY_COUNT: int = 5  # Per request, for connection errors and 5xx responses
+HTTP_RETRY_BACKOFF_FACTOR: float = 0.3
+HTTP_RETRY_BACKOFF_MAX: float = 10.0  # Seconds
+HTTP_RETRY_STATUSES: Tuple[int, ...] = (500, 502, 503, 504)
+DOWNLOAD_RETRY_COUNT: int = 3  # Attempts per image when reading the body fails
+DOWNLOAD_CHUNK_SIZE: int = 64 * 1024
+HTTP_POOL_CONNECTIONS: int = 32
+HTTP_POOL_MAXSIZE: int = 64  # Keep >= number of concurrent download workers
+DOWNLOAD_WORKER_COUNT: int = HTTP_POOL_MAXSIZE
+DOWNLOAD_THREAD_STACK_SIZE: int = 512 * 1024  # Bytes; workers only do blocking I/O
 
 # Parse time ranges
 start_time: datetime.datetime = datetime.datetime.strptime(TIME_FROM, "%Y-%m-%d %H:%M:%S")
 end_time: datetime.datetime = datetime.datetime.strptime(TIME_TILL, "%Y-%m-%d %H:%M:%S")
-
-
-def get_host_id(host_name: str) -> List[Dict[str, str]]:
+FILENAME_TIME_STR: str = f"{start_time:%Y-%m-%d_%H%M%S}_{end_time:%Y-%m-%d_%H%M%S}"
+
+# Shared HTTP session: pooled keep-alive connections and the web UI auth cookies.
+# Transient failures are retried by urllib3 with exponential backoff.
+SESSION: requests.Session = requests.Session()
+HTTP_ADAPTER: HTTPAdapter = HTTPAdapter(
+    pool_connections=HTTP_POOL_CONNECTIONS,
+    pool_maxsize=HTTP_POOL_MAXSIZE,
+    max_retries=Retry(
+        total=HTTP_RETRY_COUNT,
+        backoff_factor=HTTP_RETRY_BACKOFF_FACTOR,
+        backoff_max=HTTP_RETRY_BACKOFF_MAX,
+        status_forcelist=HTTP_RETRY_STATUSES,
+        allowed_methods=frozenset(['GET', 'POST']),
+        # Return the last 5xx response instead of raising RetryError, so
+        # callers still see it via status_code / raise_for_status()
+        raise_on_status=False,
+        # Retry-After is not capped by backoff_max; ignore it to keep waits bounded
+        respect_retry_after_header=False
+    )
+)
+SESSION.mount('https://', HTTP_ADAPTER)
+SESSION.mount('http://', HTTP_ADAPTER)  # ZABBIX_API_URL may be plain http
+
+# Worker threads log through a queue; one listener thread writes to stdout
+logger: logging.Logger = logging.getLogger(__name__)
+
+# Pre-serialized JSON-RPC bodies; only the filter value is spliced in per call
+HOST_GET_REQUEST_TEMPLATE: bytes = (
+    b'{"jsonrpc":"2.0","method":"host.get",'
+    b'"params":{"output":["hostid","host"],"filter":{"host":%s}},"id":1}'
+)
+ITEM_GET_REQUEST_TEMPLATE: bytes = (
+    b'{"jsonrpc":"2.0","method":"item.get",'
+    b'"params":{"output":["itemid","hostid","name"],"hostids":%s},"id":1}'
+)
+
+
+def get_host_ids(host_names: List[str]) -> List[Dict[str, str]]:
     """
-    Get host ID from Zabbix API by host name.
+    Get host IDs from Zabbix API for several host names in one request.
 
     Args:
-        host_name: Name of the host to look up
+        host_names: Names of the hosts to look up
 
     Returns:
-        List of dictionaries containing host information, typically:
-        [{'hostid': '12345'}]
+        List of dictionaries containing host information for every host found:
+        [{'hostid': '12345', 'host': 'host1'}, ...]
 
     Raises:
         requests.HTTPError: If the API request fails
-        json.JSONDecodeError: If the response is not valid JSON
+        orjson.JSONDecodeError: If the response is not valid JSON
     """
-    headers: Dict[str, str] = {'Authorization': f'Bearer {ZABBIX_API_TOKEN}'}
-    payload: Dict[str, any] = {
-        "jsonrpc": "2.0",
-        "method": "host.get",
-        "params": {
-            "output": ["hostid"],
-            "filter": {"host": host_name}
-        },
-        "id": 1
+    headers: Dict[str, str] = {
+        'Authorization': f'Bearer {ZABBIX_API_TOKEN}',
+        'Content-Type': 'application/json'
     }
+    payload: bytes = HOST_GET_REQUEST_TEMPLATE % orjson.dumps(host_names)
 
-    response: requests.Response = requests.post(ZABBIX_API_URL, json=payload, headers=headers)
+    response: requests.Response = SESSION.post(
+        ZABBIX_API_URL, data=payload, headers=headers
+    )
     response.raise_for_status()
 
-    response_data: Dict[str, any] = json.loads(response.text)
+    response_data: Dict[str, any] = orjson.loads(response.content)
     return response_data['result']
 
 
-def get_item_list(host_id: str) -> List[Dict[str, str]]:
+def get_item_list(host_ids: List[str]) -> List[Dict[str, str]]:
     """
-    Get list of items for a specific host from Zabbix API.
+    Get list of items for several hosts from Zabbix API in one request.
 
     Args:
-        host_id: Host ID to get items for
+        host_ids: Host IDs to get items for
 
     Returns:
         List of dictionaries containing item information:
@@ -80,112 +133,173 @@ def get_item_list(host_id: str) -> List[Dict[str, str]]:
 
     Raises:
         requests.HTTPError: If the API request fails
-        json.JSONDecodeError: If the response is not valid JSON
+        orjson.JSONDecodeError: If the response is not valid JSON
     """
-    headers: Dict[str, str] = {'Authorization': f'Bearer {ZABBIX_API_TOKEN}'}
-    payload: Dict[str, any] = {
-        "jsonrpc": "2.0",
-        "method": "item.get",
-        "params": {
-            "output": ["itemid", "hostid", "name"],
-            "hostids": host_id
-        },
-        "id": 1
+    headers: Dict[str, str] = {
+        'Authorization': f'Bearer {ZABBIX_API_TOKEN}',
+        'Content-Type': 'application/json'
     }
+    payload: bytes = ITEM_GET_REQUEST_TEMPLATE % orjson.dumps(host_ids)
 
-    response: requests.Response = requests.post(ZABBIX_API_URL, json=payload, headers=headers)
+    response: requests.Response = SESSION.post(
+        ZABBIX_API_URL, data=payload, headers=headers
+    )
     response.raise_for_status()
 
-    response_data: Dict[str, any] = json.loads(response.text)
+    response_data: Dict[str, any] = orjson.loads(response.content)
     return response_data['result']
 
 
-def generate_graph_url(
+def generate_graph_url_prefix(
         zabbix_host: str,
         start_time: datetime.datetime,
         end_time: datetime.datetime,
-        item_id: str,
         width: int,
         height: int
 ) -> str:
     """
-    Generate URL for graph image download.
+    Generate the item-independent part of the graph image URL.
 
     Args:
         zabbix_host: Zabbix server hostname
         start_time: Start time for graph data
         end_time: End time for graph data
-        item_id: Item ID to generate graph for
         width: Image width in pixels
         height: Image height in pixels
 
     Returns:
-        Complete URL for graph image with proper URL encoding
+        URL of chart.php with the shared, URL encoded query parameters
     """
     base_url: str = f'https://{zabbix_host}/chart.php'
 
     params: Dict[str, any] = {
         'from': start_time.strftime("%Y-%m-%d %H:%M:%S"),
         'to': end_time.strftime("%Y-%m-%d %H:%M:%S"),
-        'itemids[0]': item_id,
         'type': '0',
         'profileIdx': 'web.item.graph.filter',
-        'profileIdx2': item_id,
         'width': width,
         'height': height
     }
 
-    # URL encode parameters
-    query_string: str = '&'.join([f"{k}={quote(str(v))}" for k, v in params.items()])
+    return f"{base_url}?{urlencode(params, quote_via=quote)}"
+
+
+def generate_graph_url(url_prefix: str, item_id: str) -> str:
+    """
+    Generate URL for graph image download.
+
+    Args:
+        url_prefix: Shared URL part from generate_graph_url_prefix()
+        item_id: Item ID to generate graph for
+
+    Returns:
+        Complete URL for graph image with proper URL encoding
+    """
+    quoted_item_id: str = quote(item_id)
 
-    return f"{base_url}?{query_string}"
+    return f"{url_prefix}&itemids%5B0%5D={quoted_item_id}&profileIdx2={quoted_item_id}"
+
+
+def remove_partial_file(partial_path: str) -> None:
+    """
+    Remove a partially written download, if there is one.
+
+    Args:
+        partial_path: Path of the temporary file written during a download
+    """
+    try:
+        os.remove(partial_path)
+    except OSError:
+        pass
 
 
 def download_image(
         image_url: str,
         file_path: str,
-        cookies: Dict[str, str],
-        retry_count: int = DOWNLOAD_RETRY_COUNT
+        cookies: Dict[str, str]
 ) -> bool:
     """
-    Download image from URL with retry logic.
+    Download image from URL.
+
+    Connection errors and 5xx responses are retried by the Retry policy
+    mounted on SESSION, reusing pooled connections between attempts. That
+    policy ends once the headers arrive, so failures while reading the body
+    are retried here, up to DOWNLOAD_RETRY_COUNT attempts.
 
     Args:
         image_url: URL to download image from
         file_path: Local filesystem path to save the image
         cookies: Dictionary containing authentication cookies
-        retry_count: Maximum number of retry attempts
 
     Returns:
         True if download was successful, False otherwise
     """
-    for attempt in range(retry_count):
-        try:
-            response: requests.Response = requests.post(image_url, headers=cookies, timeout=30)
+    partial_path: str = f'{file_path}.part'
 
-            if response.status_code == 200:
-                with open(file_path, 'wb') as image_file:
-                    image_file.write(response.content)
-                print(f'Successfully saved: {file_path}')
-                return True
-            else:
-                print(f'Got {response.status_code} for {image_url}, '
-                      f'retry {attempt + 1}/{retry_count}')
+    for attempt in range(DOWNLOAD_RETRY_COUNT):
+        try:
+            with SESSION.get(image_url, cookies=cookies, timeout=30,
+                             stream=True) as response:
+                if response.status_code == 200:
+                    # Stream the body to a temporary file and only move it into
+                    # place once complete, so an interrupted download never
+                    # leaves a truncated image that later runs would skip
+                    response.raw.decode_content = True
+                    with open(partial_path, 'wb') as image_file:
+                        shutil.copyfileobj(response.raw, image_file,
+                                           length=DOWNLOAD_CHUNK_SIZE)
+                    os.replace(partial_path, file_path)
+                    logger.debug('Successfully saved: %s', file_path)
+                    return True
+                else:
+                    logger.warning('Got %s for %s', response.status_code, image_url)
+                    return False
+
+        except (ProtocolError, ReadTimeoutError) as error:
+            # Raised only while reading the body, which Retry does not cover
+            logger.warning('Error reading %s: %s, retry %d/%d',
+                           image_url, error, attempt + 1, DOWNLOAD_RETRY_COUNT)
+            remove_partial_file(partial_path)
 
         except Exception as error:
-            print(f'Error downloading {image_url}: {error}, '
-                  f'retry {attempt + 1}/{retry_count}')
+            logger.warning('Failed to download %s: %s', image_url, error)
+            remove_partial_file(partial_path)
+            return False
 
-    print(f'Failed to download {image_url} after {retry_count} attempts')
+    logger.warning('Failed to download %s after %d attempts',
+                   image_url, DOWNLOAD_RETRY_COUNT)
     return False
 
 
+def start_log_listener() -> QueueListener:
+    """
+    Route this script's log records through a queue to a single writer thread.
+
+    Worker threads only enqueue records, so they never contend on the stdout
+    lock; the returned listener must be stopped to flush remaining records.
+
+    Returns:
+        Started listener writing log records to stdout
+    """
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    logger.addHandler(QueueHandler(log_queue))
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+
+    listener: QueueListener = QueueListener(log_queue, logging.StreamHandler(sys.stdout))
+    listener.start()
+    return listener
+
+
 def get_auth_cookies() -> Dict[str, str]:
     """
     Authenticate with Zabbix web UI and get session cookies.
 
+    The cookies are stored on the shared SESSION, so subsequent requests
+    made through it are authenticated automatically.
+
     Returns:
-        Dictionary containing Cookie header for authenticated session
+        Dictionary of session cookie names to values
 
     Raises:
         requests.HTTPError: If authentication fails
@@ -199,17 +313,13 @@ def get_auth_cookies() -> Dict[str, str]:
         'enter': 'Enter'
     }
 
-    session: requests.Session = requests.Session()
-    response: requests.Response = session.post(login_url, data=login_data)
+    response: requests.Response = SESSION.post(login_url, data=login_data)
     response.raise_for_status()
 
-    # Extract cookies from session and format for header
-    cookie_dict: Dict[str, str] = session.cookies.get_dict()
-    cookie_header: str = '; '.join([f'{k}={v}' for k, v in cookie_dict.items()])
-
-    return {'Cookie': cookie_header}
+    return SESSION.cookies.get_dict()
 
 
+@lru_cache(maxsize=8192)
 def sanitize_filename(filename: str) -> str:
     """
     Remove forbidden characters from filename.
@@ -220,10 +330,7 @@ def sanitize_filename(filename: str) -> str:
     Returns:
         Sanitized filename with forbidden characters removed
     """
-    sanitized_name: str = filename
-    for symbol in FORBIDDEN_SYMBOLS:
-        sanitized_name = sanitized_name.replace(symbol, "")
-    return sanitized_name
+    return filename.translate(FORBIDDEN_SYMBOLS_TABLE)
 
 
 def create_download_queue(cookies: Dict[str, str]) -> Dict[str, str]:
@@ -237,51 +344,73 @@ def create_download_queue(cookies: Dict[str, str]) -> Dict[str, str]:
         Dictionary mapping image URLs to local file paths
     """
     download_queue: Dict[str, str] = {}
+    output_dir: str = os.getcwd()
+    graph_url_prefix: str = generate_graph_url_prefix(
+        ZABBIX_HOST, start_time, end_time,
+        RESULTING_IMAGE_WIDTH, RESULTING_IMAGE_HEIGHT
+    )
 
-    for host_name in HOST_LIST:
-        print(f"Processing host: {host_name}")
+    if not HOST_LIST:
+        return download_queue
 
-        try:
-            host_info: List[Dict[str, str]] = get_host_id(host_name)
-            if not host_info:
-                print(f"No host found with name: {host_name}")
-                continue
+    # Resolve all hosts and fetch all their items in two API round trips
+    try:
+        host_info: List[Dict[str, str]] = get_host_ids(HOST_LIST)
+        host_ids: Dict[str, str] = {host['host']: host['hostid'] for host in host_info}
+    except (requests.HTTPError, orjson.JSONDecodeError, KeyError) as e:
+        print(f"Failed to get host IDs: {e}")
+        return download_queue
+
+    if not host_ids:
+        print("No hosts found.")
+        return download_queue
+
+    # Create all host directories in one pass, outside the per-item loop
+    host_dirs: Dict[str, str] = {
+        host_name: os.path.join(output_dir, host_name) for host_name in host_ids
+    }
+    for host_dir in host_dirs.values():
+        os.makedirs(host_dir, exist_ok=True)
 
-            host_id: str = host_info[0]['hostid']
+    try:
+        items_by_host: Dict[str, List[Dict[str, str]]] = {}
+        for item in get_item_list(list(host_ids.values())):
+            items_by_host.setdefault(item['hostid'], []).append(item)
+    except (requests.HTTPError, orjson.JSONDecodeError, KeyError) as e:
+        print(f"Failed to get items: {e}")
+        return download_queue
+
+    # dict.fromkeys() drops repeated host names while keeping HOST_LIST order
+    for host_name in dict.fromkeys(HOST_LIST):
+        print(f"Processing host: {host_name}")
 
-        except (requests.HTTPError, json.JSONDecodeError, KeyError, IndexError) as e:
-            print(f"Failed to get host ID for {host_name}: {e}")
+        host_id: Optional[str] = host_ids.get(host_name)
+        if host_id is None:
+            print(f"No host found with name: {host_name}")
             continue
 
-        # Create host directory
-        host_dir: str = os.path.join(os.getcwd(), host_name)
-        os.makedirs(host_dir, exist_ok=True)
+        host_dir: str = host_dirs[host_name]
 
-        try:
-            items: List[Dict[str, str]] = get_item_list(host_id)
-        except (requests.HTTPError, json.JSONDecodeError) as e:
-            print(f"Failed to get items for host {host_name}: {e}")
-            continue
+        # One directory read instead of a stat() per item
+        existing_files: Set[str] = {entry.name for entry in os.scandir(host_dir)}
+
+        items: List[Dict[str, str]] = items_by_host.get(host_id, [])
 
         for item in items:
             item_id: str = item['itemid']
             item_name: str = sanitize_filename(item['name'])
 
             # Generate filename with timestamp
-            time_str: str = f"{start_time:%Y-%m-%d_%H%M%S}_{end_time:%Y-%m-%d_%H%M%S}"
-            filename: str = f"{host_name}_{item_name}_{item_id}_{time_str}.png"
+            filename: str = f"{host_name}_{item_name}_{item_id}_{FILENAME_TIME_STR}.png"
             file_path: str = os.path.join(host_dir, filename)
 
             # Skip if file already exists
-            if os.path.exists(file_path):
+            if filename in existing_files:
                 print(f'Skipping existing file: {file_path}')
                 continue
 
             # Generate graph URL and add to download queue
-            graph_url: str = generate_graph_url(
-                ZABBIX_HOST, start_time, end_time, item_id,
-                RESULTING_IMAGE_WIDTH, RESULTING_IMAGE_HEIGHT
-            )
+            graph_url: str = generate_graph_url(graph_url_prefix, item_id)
             download_queue[graph_url] = file_path
 
     return download_queue
@@ -292,7 +421,7 @@ def download_images_multithreaded(
         cookies: Dict[str, str]
 ) -> None:
     """
-    Download all images in the queue using multithreading.
+    Download all images in the queue using a bounded pool of worker threads.
 
     Args:
         download_queue: Dictionary mapping URLs to file paths
@@ -303,24 +432,38 @@ def download_images_multithreaded(
         return
 
     print(f"Starting download of {len(download_queue)} images...")
-    threads: List[Thread] = []
 
-    with tqdm(total=len(download_queue), desc="Downloading images") as progress_bar:
-        for url, file_path in download_queue.items():
-            thread: Thread = Thread(
-                target=download_image,
-                args=(url, file_path, cookies),
-                kwargs={'retry_count': DOWNLOAD_RETRY_COUNT}
-            )
-            threads.append(thread)
-            thread.start()
-
-        # Wait for all threads to complete and update progress
-        for thread in threads:
-            thread.join()
-            progress_bar.update(1)
-
-    print("All downloads completed!")
+    with tqdm(total=len(download_queue), desc="Downloading images",
+              mininterval=0.5) as progress_bar:
+        with ThreadPoolExecutor(max_workers=DOWNLOAD_WORKER_COUNT) as executor:
+            # The executor starts its workers inside submit(), so only they get
+            # the smaller stack; restore the previous size for any other thread
+            previous_stack_size: int = threading.stack_size(DOWNLOAD_THREAD_STACK_SIZE)
+            try:
+                futures: Dict[Future, str] = {
+                    executor.submit(download_image, url, file_path, cookies): url
+                    for url, file_path in download_queue.items()
+                }
+            finally:
+                threading.stack_size(previous_stack_size)
+
+            # Update progress as each download finishes, in completion order
+            failed_urls: List[str] = []
+            for future in as_completed(futures):
+                if not future.result():
+                    failed_urls.append(futures[future])
+                    progress_bar.set_postfix(failed=len(failed_urls), refresh=False)
+                progress_bar.update(1)
+
+    # Log the summary through the same queue as the worker warnings, so it is
+    # written after any of them that are still pending
+    if failed_urls:
+        logger.info('Downloads completed, %d of %d failed:',
+                    len(failed_urls), len(download_queue))
+        for url in failed_urls:
+            logger.info('  %s', url)
+    else:
+        logger.info('All downloads completed!')
 
 
 def main() -> None:
@@ -340,7 +483,11 @@ def main() -> None:
     download_queue: Dict[str, str] = create_download_queue(cookies)
 
     # Download all images
-    download_images_multithreaded(download_queue, cookies)
+    log_listener: QueueListener = start_log_listener()
+    try:
+        download_images_multithreaded(download_queue, cookies)
+    finally:
+        log_listener.stop()
 
 
 if __name__ == "__main__":